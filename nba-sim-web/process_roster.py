@@ -1,6 +1,13 @@
 import csv
-import math
+import io
+import json
 import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+# Number of threads used to read and write the team files
+IO_WORKERS = 8
 
 # Team name mapping from the main roster to team file names
 TEAM_MAPPING = {
@@ -36,61 +43,128 @@ TEAM_MAPPING = {
     "Washington Wizards": "Wizards"
 }
 
-def process_player(row):
+# Column order of the generated team CSV files
+FIELDNAMES = (
+    'name', 'englishName', 'position', 'playerType', 'rotationType',
+    'rating', 'insideRating', 'midRating', 'threeRating', 'freeThrowPercent',
+    'interiorDefense', 'perimeterDefense', 'orbRating', 'drbRating', 'astRating',
+    'stlRating', 'blkRating', 'layupRating', 'standDunk', 'drivingDunk',
+    'athleticism', 'durability', 'offConst', 'defConst', 'drawFoul'
+)
+
+# Team CSV columns copied straight from a main roster column
+COLUMN_MAPPING = {
+    'rating': 'overallAttribute',
+    'insideRating': 'closeShot',
+    'midRating': 'midRangeShot',
+    'threeRating': 'threePointShot',
+    'freeThrowPercent': 'freeThrow',
+    'interiorDefense': 'interiorDefense',
+    'perimeterDefense': 'perimeterDefense',
+    'orbRating': 'offensiveRebound',
+    'drbRating': 'defensiveRebound',
+    'stlRating': 'steal',
+    'blkRating': 'block',
+    'layupRating': 'layup',
+    'standDunk': 'standingDunk',
+    'drivingDunk': 'drivingDunk',
+    'durability': 'overallDurability',
+    'offConst': 'offensiveConsistency',
+    'defConst': 'defensiveConsistency',
+    'drawFoul': 'drawFoul'
+}
+
+# Main roster columns averaged into astRating and athleticism
+AST_RATING_COLUMNS = ('passAccuracy', 'passIQ', 'passVision')
+ATHLETICISM_COLUMNS = ('speed', 'agility', 'strength', 'vertical', 'stamina', 'hustle')
+
+# Main roster columns read for each player, in the order process_player expects them
+INPUT_COLUMNS = (
+    'name', 'position',
+    *AST_RATING_COLUMNS,
+    *ATHLETICISM_COLUMNS,
+    *(COLUMN_MAPPING[field] for field in FIELDNAMES if field in COLUMN_MAPPING)
+)
+_AST_RATING_START = 2  # After name and position
+_ATHLETICISM_START = _AST_RATING_START + len(AST_RATING_COLUMNS)
+_COPIED_START = _ATHLETICISM_START + len(ATHLETICISM_COLUMNS)
+_AST_RATING_VALUES = slice(_AST_RATING_START, _ATHLETICISM_START)
+_ATHLETICISM_VALUES = slice(_ATHLETICISM_START, _COPIED_START)
+_COPIED_VALUES = slice(_COPIED_START, None)
+
+# Positions of the derived ratings in the output row; every other column after
+# the five preserved ones is copied from COLUMN_MAPPING in FIELDNAMES order
+_AST_RATING_INDEX = FIELDNAMES.index('astRating')
+_ATHLETICISM_INDEX = FIELDNAMES.index('athleticism')
+assert [field for field in FIELDNAMES if field not in COLUMN_MAPPING] == [
+    'name', 'englishName', 'position', 'playerType', 'rotationType', 'astRating', 'athleticism'
+]
+
+# A team's output file, its preserved player data, and its rating-sorted main roster rows
+TeamRoster = namedtuple('TeamRoster', ['short_name', 'output_file', 'existing_player_info', 'players'])
+
+def process_player(values, existing_data=None):
     """
     Process a single player row and extract the required attributes.
     
     Args:
-        row: Dictionary containing player data from the main roster
+        values: Tuple of main roster values in INPUT_COLUMNS order
+        existing_data: Preserved data for this player from the existing team file, if any
         
     Returns:
-        Dictionary with processed player data
+        List of processed player values in FIELDNAMES order
     """
-    # Calculate astRating: (passAccuracy + passIQ + passVision) / 3, use math.floor
-    pass_accuracy = int(row['passAccuracy'])
-    pass_iq = int(row['passIQ'])
-    pass_vision = int(row['passVision'])
-    ast_rating = math.floor((pass_accuracy + pass_iq + pass_vision) / 3)
-    
-    # Calculate athleticism: (speed + agility + strength + vertical + stamina + hustle) / 6, use math.floor
-    speed = int(row['speed'])
-    agility = int(row['agility'])
-    strength = int(row['strength'])
-    vertical = int(row['vertical'])
-    stamina = int(row['stamina'])
-    hustle = int(row['hustle'])
-    athleticism = math.floor((speed + agility + strength + vertical + stamina + hustle) / 6)
-    
-    # Create processed player data
-    processed_data = {
-        'name': row['name'],
-        'englishName': row['name'],  # Same as name since the main roster uses English names
-        'position': row['position'],
-        'playerType': '',  # This will need to be filled manually or with additional logic
-        'rotationType': '',  # This will need to be filled manually or with additional logic
-        'rating': row['overallAttribute'],
-        'insideRating': row['closeShot'],
-        'midRating': row['midRangeShot'],
-        'threeRating': row['threePointShot'],
-        'freeThrowPercent': row['freeThrow'],
-        'interiorDefense': row['interiorDefense'],
-        'perimeterDefense': row['perimeterDefense'],
-        'orbRating': row['offensiveRebound'],
-        'drbRating': row['defensiveRebound'],
-        'astRating': str(ast_rating),
-        'stlRating': row['steal'],
-        'blkRating': row['block'],
-        'layupRating': row['layup'],
-        'standDunk': row['standingDunk'],
-        'drivingDunk': row['drivingDunk'],
-        'athleticism': str(athleticism),
-        'durability': row['overallDurability'],
-        'offConst': row['offensiveConsistency'],
-        'defConst': row['defensiveConsistency'],
-        'drawFoul': row['drawFoul']
-    }
+    name, position = values[0], values[1]
+    
+    # Calculate astRating: (passAccuracy + passIQ + passVision) / 3, rounded down
+    ast_rating = sum(map(int, values[_AST_RATING_VALUES])) // len(AST_RATING_COLUMNS)
+    
+    # Calculate athleticism: (speed + agility + strength + vertical + stamina + hustle) / 6, rounded down
+    athleticism = sum(map(int, values[_ATHLETICISM_VALUES])) // len(ATHLETICISM_COLUMNS)
+    
+    if existing_data is not None:
+        # Preserve all the specified columns from existing data
+        preserved = (
+            existing_data['name'],
+            existing_data['englishName'],
+            existing_data['position'],
+            existing_data['playerType'],
+            existing_data['rotationType']
+        )
+    else:
+        # englishName is the same as name since the main roster uses English names;
+        # playerType and rotationType will need to be filled manually or with additional logic
+        preserved = (name, name, position, '', '')
+    
+    # Create processed player data in FIELDNAMES order
+    processed = [*preserved, *values[_COPIED_VALUES]]
+    processed.insert(_AST_RATING_INDEX, ast_rating)
+    processed.insert(_ATHLETICISM_INDEX, athleticism)
+    return processed
+
+def preserved_player_info(players, key_index):
+    """
+    Map players to their preserved name, englishName, position, playerType, and rotationType.
     
-    return processed_data
+    Args:
+        players: Iterable of rows starting with the five preserved columns in FIELDNAMES order
+        key_index: Index of the column to match players on; players with an empty key are skipped
+        
+    Returns:
+        Dictionary mapping player keys to their preserved data
+    """
+    player_info = {}
+    for player in players:
+        key = player[key_index]
+        if key:
+            player_info[key] = {
+                'name': player[0],
+                'englishName': player[1],
+                'position': player[2],
+                'playerType': player[3],
+                'rotationType': player[4]
+            }
+    return player_info
 
 def read_existing_team_data(team_file_path):
     """
@@ -102,96 +176,199 @@ def read_existing_team_data(team_file_path):
     Returns:
         Dictionary mapping player English names to their existing data
     """
-    player_info = {}
-    if os.path.exists(team_file_path):
-        with open(team_file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Use englishName as the primary key for matching
-                english_name = row.get('englishName', row.get('name', ''))
-                if english_name:
-                    player_info[english_name] = {
-                        'name': row.get('name', ''),
-                        'englishName': row.get('englishName', ''),
-                        'position': row.get('position', ''),
-                        'playerType': row.get('playerType', ''),
-                        'rotationType': row.get('rotationType', '')
-                    }
+    try:
+        f = open(team_file_path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return {}
+    with f:
+        reader = csv.DictReader(f)
+        
+        # Use englishName as the primary key for matching, falling back to name
+        # for files without an englishName column
+        key_index = 1 if 'englishName' in (reader.fieldnames or ()) else 0
+        return preserved_player_info(
+            (
+                (row.get('name', ''), row.get('englishName', ''), row.get('position', ''),
+                 row.get('playerType', ''), row.get('rotationType', ''))
+                for row in reader
+            ),
+            key_index
+        )
+
+def read_cached_team_data(team_file_path, cache):
+    """
+    Read existing team data, reusing the cached copy if the file is unchanged.
+    
+    Args:
+        team_file_path: Path to the existing team CSV file
+        cache: Dictionary mapping team file paths to their last seen mtime and data,
+               updated in place
+        
+    Returns:
+        Dictionary mapping player English names to their existing data
+    """
+    try:
+        mtime = os.stat(team_file_path).st_mtime_ns
+    except FileNotFoundError:
+        cache.pop(team_file_path, None)
+        return {}
+    
+    entry = cache.get(team_file_path)
+    if entry is not None and entry['mtime'] == mtime:
+        return entry['data']
+    
+    player_info = read_existing_team_data(team_file_path)
+    cache[team_file_path] = {'mtime': mtime, 'data': player_info}
     return player_info
 
-def process_roster(input_file, output_dir):
+def read_cache(cache_file):
+    """
+    Read the existing team data cache.
+    
+    Args:
+        cache_file: Path to the cache file
+        
+    Returns:
+        The cached data, or an empty dictionary if the cache is missing, unreadable, or not an object
+    """
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+def write_team_data(team_file_path, processed_players):
+    """
+    Write processed players to a team CSV file.
+    
+    Args:
+        team_file_path: Path to the team CSV file
+        processed_players: Iterable of processed player rows in FIELDNAMES order
+    """
+    with open(team_file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        writer.writerows(processed_players)
+
+def process_roster(input_file, output_dir, cache_file=None):
     """
     Process the main roster file and generate team-specific CSV files.
     
     Args:
         input_file: Path to the main roster CSV
         output_dir: Directory where team CSV files will be saved
+        cache_file: Optional path to a cache of existing team data, used to skip
+                    re-parsing team files that have not changed since the last run
     """
-    # Read the main roster
-    players_by_team = {}
+    # Read all existing team data up front to preserve name, englishName, position, playerType, and rotationType
+    output_files = {
+        team_short_name: os.path.join(output_dir, f"{team_short_name}.csv")
+        for team_short_name in TEAM_MAPPING.values()
+    }
+    cache = read_cache(cache_file) if cache_file else {}
+    with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+        existing_by_team = dict(zip(
+            output_files.keys(),
+            executor.map(lambda path: read_cached_team_data(path, cache), output_files.values())
+        ))
     
+    # The roster is small, so read it in one go rather than line by line
     with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            team = row['team']
-            if team not in players_by_team:
-                players_by_team[team] = []
-            players_by_team[team].append(row)
-    
-    # Process each team
-    for team_full_name, players in players_by_team.items():
-        if team_full_name in TEAM_MAPPING:
-            team_short_name = TEAM_MAPPING[team_full_name]
-            output_file = os.path.join(output_dir, f"{team_short_name}.csv")
-            
-            # Read existing team data to preserve name, englishName, position, playerType, and rotationType
-            existing_player_info = read_existing_team_data(output_file)
-            
-            print(f"Processing {team_full_name} -> {team_short_name}.csv ({len(players)} players)")
-            
-            # Process players for this team
-            processed_players = []
-            for player_row in players:
-                processed = process_player(player_row)
-                
-                # Check if this player exists in the existing file
-                player_english_name = player_row['name']  # The main roster uses English names
-                if player_english_name in existing_player_info:
-                    # Preserve all the specified columns from existing data
-                    existing_data = existing_player_info[player_english_name]
-                    processed['name'] = existing_data['name']
-                    processed['englishName'] = existing_data['englishName']
-                    processed['position'] = existing_data['position']
-                    processed['playerType'] = existing_data['playerType']
-                    processed['rotationType'] = existing_data['rotationType']
-                
-                processed_players.append(processed)
-            
-            # Sort by rating (descending) to have best players first
-            processed_players.sort(key=lambda x: int(x['rating']), reverse=True)
-            
-            # Write to team CSV file
-            fieldnames = [
-                'name', 'englishName', 'position', 'playerType', 'rotationType',
-                'rating', 'insideRating', 'midRating', 'threeRating', 'freeThrowPercent',
-                'interiorDefense', 'perimeterDefense', 'orbRating', 'drbRating', 'astRating',
-                'stlRating', 'blkRating', 'layupRating', 'standDunk', 'drivingDunk',
-                'athleticism', 'durability', 'offConst', 'defConst', 'drawFoul'
+        reader = csv.reader(io.StringIO(f.read()))
+    
+    # Resolve column positions once from the header row; an empty roster has nothing to process
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = {column: index for index, column in enumerate(header)}
+    team_index = columns['team']
+    name_index = columns['name']
+    get_player_values = itemgetter(*(columns[column] for column in INPUT_COLUMNS))
+    rating_index = columns[COLUMN_MAPPING['rating']]
+    
+    # Set up each team in roster order, keeping only rows whose team is mapped.
+    # Teams without a mapping are kept as None so they are reported in order.
+    roster_teams = {}
+    mapped_rows = []
+    
+    for row in reader:
+        if not row:
+            continue  # Skip blank lines like csv.DictReader does
+        team_full_name = row[team_index]
+        if team_full_name not in roster_teams:
+            team_short_name = TEAM_MAPPING.get(team_full_name)
+            roster_teams[team_full_name] = None if team_short_name is None else TeamRoster(
+                short_name=team_short_name,
+                output_file=output_files[team_short_name],
+                existing_player_info=existing_by_team[team_short_name],
+                players=[]
+            )
+        if roster_teams[team_full_name] is not None:
+            mapped_rows.append(row)
+    teams = {team_full_name: team for team_full_name, team in roster_teams.items() if team is not None}
+    
+    # Sort by rating (descending) once, so each team's players are already in
+    # order as they are grouped
+    mapped_rows.sort(key=lambda row: int(row[rating_index]), reverse=True)
+    for row in mapped_rows:
+        teams[row[team_index]].players.append(row)
+    
+    def process_team(team, preserved_rows):
+        # Look up each player in the existing file first; the main roster uses English names
+        for row in team.players:
+            processed = process_player(get_player_values(row), team.existing_player_info.get(row[name_index]))
+            preserved_rows.append(processed[:5])
+            yield processed
+    
+    # Stream each team's processed players into a temporary file next to its
+    # team file. The files are independent, so they are written concurrently.
+    temp_files = {team_full_name: f"{team.output_file}.tmp" for team_full_name, team in teams.items()}
+    preserved_by_team = {team_full_name: [] for team_full_name in teams}
+    try:
+        with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+            futures = [
+                executor.submit(
+                    write_team_data,
+                    temp_files[team_full_name],
+                    process_team(team, preserved_by_team[team_full_name])
+                )
+                for team_full_name, team in teams.items()
             ]
-            
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(processed_players)
-            
-            print(f"  -> Saved {len(processed_players)} players to {output_file}")
-        else:
+            for future in futures:
+                future.result()
+    except BaseException:
+        # A bad roster value fails the run without touching any existing team file
+        for temp_file in temp_files.values():
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        raise
+    
+    # Every team was processed, so replace the team files with the new ones
+    for team_full_name, team in roster_teams.items():
+        if team is None:
             print(f"Warning: No mapping found for team '{team_full_name}'")
+            continue
+        
+        os.replace(temp_files[team_full_name], team.output_file)
+        
+        # Refresh the cache with the preserved columns as they will read back from the new file
+        cache[team.output_file] = {
+            'mtime': os.stat(team.output_file).st_mtime_ns,
+            'data': preserved_player_info(preserved_by_team[team_full_name], FIELDNAMES.index('englishName'))
+        }
+        print(f"Processing {team_full_name} -> {team.short_name}.csv ({len(team.players)} players)")
+        print(f"  -> Saved {len(team.players)} players to {team.output_file}")
+    
+    if cache_file:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
 
 def main():
     # File paths
     input_file = 'public/data/rosters/temp.csv'
     output_dir = 'public/data/rosters'
+    cache_file = '.roster_cache.json'
     
     # Check if input file exists
     if not os.path.exists(input_file):
@@ -204,7 +381,7 @@ def main():
     print("-" * 60)
     
     # Process the roster
-    process_roster(input_file, output_dir)
+    process_roster(input_file, output_dir, cache_file)
     
     print("-" * 60)
     print("Roster processing completed!")